@@ -1,6 +1,11 @@
 import os
 from typing import Optional
 
+from dotenv import load_dotenv
+
+# Settings are read when this module is imported, so .env must be loaded first
+load_dotenv()
+
 class Settings:
     """Application settings and configuration"""
 
@@ -35,6 +40,16 @@ class Settings:
     If you don't have specific product information, say so honestly and offer to help in other ways.
     """
 
+    # Session Maintenance
+    SESSION_RETENTION_DAYS: int = int(os.getenv("SESSION_RETENTION_DAYS", "90"))  # delete sessions/archives idle longer than this
+    SESSION_COMPACT_AFTER_DAYS: int = int(os.getenv("SESSION_COMPACT_AFTER_DAYS", "7"))  # archive a summary, drop the history
+    MAX_STORED_MESSAGES: int = int(os.getenv("MAX_STORED_MESSAGES", "50"))  # per-session history cap
+    MAINTENANCE_INTERVAL: int = int(os.getenv("MAINTENANCE_INTERVAL", "3600"))  # seconds between runs
+    MAINTENANCE_BATCH_SIZE: int = int(os.getenv("MAINTENANCE_BATCH_SIZE", "200"))  # rows per write transaction
+    MAINTENANCE_MAX_BATCHES: int = int(os.getenv("MAINTENANCE_MAX_BATCHES", "50"))  # per step, per run
+    MAINTENANCE_PAUSE: float = float(os.getenv("MAINTENANCE_PAUSE", "0.05"))  # seconds between batches
+    VACUUM_PAGES_PER_STEP: int = int(os.getenv("VACUUM_PAGES_PER_STEP", "500"))
+
     # API Configuration
     API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
     API_PORT: int = int(os.getenv("API_PORT", "8000"))
@@ -44,6 +59,17 @@ class Settings:
     RATE_LIMIT_REQUESTS: int = int(os.getenv("RATE_LIMIT_REQUESTS", "100"))
     RATE_LIMIT_WINDOW: int = int(os.getenv("RATE_LIMIT_WINDOW", "60"))  # seconds
 
+    # Profiling (opt-in; off unless a token or a sample rate is set)
+    PROFILE_TOKEN: str = os.getenv("PROFILE_TOKEN", "")  # requests with a matching X-Profile header are profiled
+    PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # fraction of requests profiled
+    PROFILE_INTERVAL: float = float(os.getenv("PROFILE_INTERVAL", "0.005"))  # seconds between stack samples
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_MAX_FILES: int = int(os.getenv("PROFILE_MAX_FILES", "50"))  # profiles kept on disk
+
+    # Shared state across uvicorn workers (quota counters, response cache)
+    SHARED_STATE_URL: str = os.getenv("SHARED_STATE_URL", "sqlite:///./shared_state.db")  # or memory:// for one worker
+    RESPONSE_CACHE_TTL: int = int(os.getenv("RESPONSE_CACHE_TTL", "600"))  # seconds; 0 disables the reply cache
+
     # Security
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
 
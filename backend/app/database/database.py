@@ -11,6 +11,10 @@ engine = create_engine(
 
 def create_tables():
     """Create database tables"""
+    if "sqlite" in DATABASE_URL:
+        # Must be set before the first table exists; lets maintenance reclaim space incrementally
+        with engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
     SQLModel.metadata.create_all(engine)
 
 def get_session() -> Generator[Session, None, None]:
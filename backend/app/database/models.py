@@ -75,7 +75,7 @@ class ChatSession(SQLModel, table=True):
     # Timestamps
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
-    last_activity: datetime = Field(default_factory=datetime.utcnow)
+    last_activity: datetime = Field(default_factory=datetime.utcnow, index=True)
 
     def add_message(self, role: str, content: str, metadata: dict = None):
         """Add a message to the conversation"""
@@ -106,6 +106,24 @@ class ChatSession(SQLModel, table=True):
             return json.loads(self.context)
         return {}
 
+class ChatSessionArchive(SQLModel, table=True):
+    """Summary of a compacted chat session whose full history was dropped"""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    session_id: str = Field(index=True, description="Original chat session identifier")
+    user_id: Optional[str] = Field(default=None, index=True, description="User identifier (if authenticated)")
+
+    summary: str = Field(description="JSON string of the session summary")
+    message_count: int = Field(default=0, description="Number of messages in the original session")
+
+    created_at: datetime = Field(description="Original session creation timestamp")
+    last_activity: datetime = Field(index=True, description="Original session last activity")
+    archived_at: datetime = Field(default_factory=datetime.utcnow)
+
+    def get_summary(self) -> dict:
+        """Get session summary"""
+        return json.loads(self.summary) if self.summary else {}
+
 class ProductInteraction(SQLModel, table=True):
     """Track product interactions for analytics and recommendations"""
 
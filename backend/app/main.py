@@ -1,18 +1,28 @@
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+import asyncio
+import hashlib
 import json
+import time
 from datetime import datetime, timedelta
-from collections import defaultdict
 import tiktoken
+from typing import Optional
 
-# Load environment variables
+# Load environment variables (before any app module reads settings)
 load_dotenv()
 
+from .config import settings
+from .services.catalog import CatalogSnapshot, catalog_store, format_price
+from .services.profiler import install_profiler, to_thread
+from .services.prompts import PromptLibrary
+from .services.shared_state import create_shared_state
+
 app = FastAPI()
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))  # streaming over WebSocket
 
 # Add CORS middleware right after app creation
 origins = [
@@ -27,9 +37,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Token tracking system (use Redis in production)
-user_tokens = defaultdict(lambda: {"count": 0, "date": datetime.now().date()})
+# Opt-in request profiling (PROFILE_TOKEN / PROFILE_SAMPLE_RATE); not installed otherwise
+install_profiler(app)
+
+# Token tracking and reply cache shared by all uvicorn workers (SHARED_STATE_URL)
+shared_state = create_shared_state()
 MAX_TOKENS_PER_DAY = 500
+QUOTA_TTL = 2 * 24 * 3600  # daily counters expire once their day is over
 
 # Initialize tokenizer for counting tokens with fallback for new models
 def get_encoding(model_name: str):
@@ -45,22 +59,23 @@ def count_tokens(text: str) -> int:
     """Count tokens in a text string"""
     return len(encoding.encode(text))
 
+def quota_key(user_id: str) -> str:
+    """Counter key for a user's token usage today (a new day starts a new counter)"""
+    return f"tokens:{user_id}:{datetime.now().date()}"
+
 def check_and_update_tokens(user_id: str, prompt_tokens: int, response_tokens: int) -> tuple[bool, int]:
-    """Check if user is within token limit and update count"""
-    today = datetime.now().date()
-    
-    # Reset count if it's a new day
-    if user_tokens[user_id]["date"] != today:
-        user_tokens[user_id] = {"count": 0, "date": today}
-    
-    total_tokens = prompt_tokens + response_tokens
-    current_count = user_tokens[user_id]["count"]
-    
-    if current_count + total_tokens > MAX_TOKENS_PER_DAY:
-        return False, current_count
-    
-    user_tokens[user_id]["count"] += total_tokens
-    return True, user_tokens[user_id]["count"]
+    """Check if user is within token limit and update count (atomic across workers)"""
+    return shared_state.incr_within(
+        quota_key(user_id),
+        prompt_tokens + response_tokens,
+        MAX_TOKENS_PER_DAY,
+        ttl=QUOTA_TTL
+    )
+
+def reply_cache_key(user_query: str, query_type: str) -> str:
+    """Cache key for an LLM reply; whitespace and case don't split entries"""
+    normalized = " ".join(user_query.lower().split())
+    return f"reply:{query_type}:{hashlib.sha1(normalized.encode()).hexdigest()}"
 
 # Static data for common queries (since no live data yet)
 STATIC_DATA = {
@@ -115,6 +130,9 @@ STATIC_DATA = {
     }
 }
 
+# Columnar product snapshot for structured filters (swapped again on catalog sync)
+catalog_store.swap(CatalogSnapshot.from_static_data(STATIC_DATA["products"]))
+
 def is_ecommerce_query(user_query: str) -> bool:
     """Check if query is e-commerce related"""
     ecommerce_keywords = [
@@ -168,6 +186,77 @@ def fetch_static_data(query_type: str) -> dict:
         return STATIC_DATA[query_type]
     return {"info": "I can help with questions about products, sizing, payments, returns, or shipping."}
 
+# Policy questions go to the LLM even when they mention a size or color ("size guide for a large shirt")
+CATALOG_EXCLUDED_TYPES = {"size_guide", "returns", "shipping", "payments"}
+
+def answer_from_catalog(user_query: str, query_type: str) -> Optional[dict]:
+    """Answer price/color/size product questions from the catalog snapshot, without the LLM"""
+    if query_type in CATALOG_EXCLUDED_TYPES:
+        return None
+
+    snapshot = catalog_store.snapshot
+    if not len(snapshot):
+        return None
+
+    filters = snapshot.parse_filters(user_query)
+    if filters is None:
+        return None
+    # Outside product queries, only a catalog category word ("black trousers on sale") makes it a product search
+    if query_type != "products" and "category" not in filters:
+        return None
+
+    matches = snapshot.query(limit=5, **filters)
+    if not matches:
+        return None  # Let the LLM answer rather than reply with a dead end
+
+    lines = [f"- [{p['name']}]({p['url']}) – {format_price(p)}" for p in matches]
+    return {
+        "response": "Here's what I found:\n" + "\n".join(lines),
+        "suggested_products": matches
+    }
+
+# Strict e-commerce focused system prompt
+CHAT_SYSTEM_PROMPT = """You are a focused e-commerce assistant for Caviaar Mode fashion website. 
+
+STRICT RULES:
+- ONLY answer questions about: products, sizing, payments, returns, shipping, offers, and store policies
+- DO NOT provide: coding help, weather info, general knowledge, or any non-shopping topics
+- Keep responses under 150 words
+- Only include [button links](URL) when specifically relevant to the query
+- Be helpful but stay within e-commerce scope
+- For product suggestions, use the provided product data
+
+Your expertise: fashion products, sizing guides, payment methods, return policies, shipping info, and customer service."""
+
+NON_ECOMMERCE_REPLY = "I'm specifically designed to help with Caviaar Mode shopping questions like products, sizing, payments, returns, and shipping. For other topics, please visit our [contact page](https://caviaarmode.com/contact-us)."
+QUERY_TOO_LONG_REPLY = "I'm sorry, but your query is too long. Please try a shorter question about our products, sizing, or services."
+DAILY_LIMIT_REPLY = f"You've reached your daily limit of {MAX_TOKENS_PER_DAY} tokens. Please try again tomorrow or contact support for extended access."
+ERROR_REPLY = "I'm having trouble right now. Please visit our [website](https://caviaarmode.com) or [contact support](https://caviaarmode.com/contact) for assistance!"
+
+def quick_reply(user_query: str, query_type: str) -> Optional[dict]:
+    """Replies that never reach the LLM: off-topic queries and catalog filter hits"""
+    if query_type == "non_ecommerce":
+        return {
+            "response": NON_ECOMMERCE_REPLY,
+            "query_type": "non_ecommerce"
+        }
+
+    # Structured product filters resolve from the snapshot before any LLM call
+    catalog_answer = answer_from_catalog(user_query, query_type)
+    if catalog_answer is not None:
+        return {**catalog_answer, "query_type": "products"}
+
+    return None
+
+# Prompt prefixes compiled once; requests only append the user's question
+prompt_library = PromptLibrary(CHAT_SYSTEM_PROMPT, fetch_static_data, count_tokens).compile(
+    [*STATIC_DATA, "general_ecommerce"]
+)
+
+def build_chat_messages(user_query: str, query_type: str) -> list:
+    """System and user messages for the LLM call"""
+    return prompt_library.build(query_type, user_query)
+
 @app.post("/api/chat")
 async def chat_endpoint(request: Request):
     try:
@@ -184,12 +273,9 @@ async def chat_endpoint(request: Request):
     # Check if query is e-commerce related
     query_type = classify_query(user_query)
     
-    if query_type == "non_ecommerce":
-        return {
-            "response": "I'm specifically designed to help with Caviaar Mode shopping questions like products, sizing, payments, returns, and shipping. For other topics, please visit our [contact page](https://caviaarmode.com/contact-us).",
-            "session_id": session_id,
-            "query_type": "non_ecommerce"
-        }
+    reply = quick_reply(user_query, query_type)
+    if reply is not None:
+        return {**reply, "session_id": session_id}
 
     # Count tokens in user query
     prompt_tokens = count_tokens(user_query)
@@ -197,48 +283,36 @@ async def chat_endpoint(request: Request):
     # Check token limit before processing
     if prompt_tokens > MAX_TOKENS_PER_DAY:
         return {
-            "response": "I'm sorry, but your query is too long. Please try a shorter question about our products, sizing, or services.",
+            "response": QUERY_TOO_LONG_REPLY,
             "session_id": session_id
         }
 
-    # Get static data
-    static_info = fetch_static_data(query_type)
-
-    # Strict e-commerce focused system prompt
-    system_prompt = """You are a focused e-commerce assistant for Caviaar Mode fashion website. 
-
-STRICT RULES:
-- ONLY answer questions about: products, sizing, payments, returns, shipping, offers, and store policies
-- DO NOT provide: coding help, weather info, general knowledge, or any non-shopping topics
-- Keep responses under 150 words
-- Only include [button links](URL) when specifically relevant to the query
-- Be helpful but stay within e-commerce scope
-- For product suggestions, use the provided product data
-
-Your expertise: fashion products, sizing guides, payment methods, return policies, shipping info, and customer service."""
-
-    user_prompt = f"Query type: {query_type}\nAvailable info: {json.dumps(static_info)}\nUser question: {user_query}"
+    cache_key = reply_cache_key(user_query, query_type)
+    # Shared-state calls block on SQLite (and its write lock), so they run off the event loop
+    cached_reply = await to_thread(shared_state.cache_get, cache_key) if settings.RESPONSE_CACHE_TTL else None
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.3,  # Lower temperature for more focused responses
-            max_tokens=150   # Limit response length
-        )
+        if cached_reply is not None:
+            bot_reply = cached_reply
+        else:
+            response = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=build_chat_messages(user_query, query_type),
+                temperature=0.3,  # Lower temperature for more focused responses
+                max_tokens=150   # Limit response length
+            )
+            bot_reply = response.choices[0].message.content
+            if settings.RESPONSE_CACHE_TTL:
+                await to_thread(shared_state.cache_set, cache_key, bot_reply, settings.RESPONSE_CACHE_TTL)
         
-        bot_reply = response.choices[0].message.content
         response_tokens = count_tokens(bot_reply)
         
         # Check and update token count (internal only, not sent to frontend)
-        within_limit, current_count = check_and_update_tokens(session_id, prompt_tokens, response_tokens)
+        within_limit, current_count = await to_thread(check_and_update_tokens, session_id, prompt_tokens, response_tokens)
         
         if not within_limit:
             return {
-                "response": f"You've reached your daily limit of {MAX_TOKENS_PER_DAY} tokens. Please try again tomorrow or contact support for extended access.",
+                "response": DAILY_LIMIT_REPLY,
                 "session_id": session_id,
                 "query_type": query_type
             }
@@ -252,10 +326,180 @@ Your expertise: fashion products, sizing guides, payment methods, return policie
     except Exception as e:
         print(f"OpenAI API error: {e}")
         return {
-            "response": "I'm having trouble right now. Please visit our [website](https://caviaarmode.com) or [contact support](https://caviaarmode.com/contact) for assistance!",
+            "response": ERROR_REPLY,
             "session_id": session_id
         }
 
+# WebSocket chat: one connection per visitor, session bound once
+WS_HEARTBEAT_INTERVAL = 20  # seconds between server pings
+WS_IDLE_TIMEOUT = 60  # close connections silent for longer than this
+WS_SEND_QUEUE_SIZE = 64  # outgoing frames buffered before streaming pauses
+WS_MAX_REPLY_TOKENS = 150  # max_tokens of a streamed reply, reserved from the quota up front
+
+class ChatConnection:
+    """
+    State pinned for the life of one WebSocket connection.
+    The session id is bound once at connect time; its quota counter lives in
+    the shared store so the daily limit holds across workers.
+    Outgoing frames go through a bounded queue, so a slow client pauses the
+    upstream token stream instead of buffering it without limit.
+    """
+
+    def __init__(self, websocket: WebSocket, session_id: str):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+        self.last_seen = time.monotonic()
+        self.turn: Optional[asyncio.Task] = None
+
+    async def run(self):
+        """Serve the connection until the client leaves or goes silent"""
+        tasks = [
+            asyncio.create_task(self._receive_loop()),
+            asyncio.create_task(self._send_loop()),
+            asyncio.create_task(self._heartbeat_loop())
+        ]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            pending = [task for task in tasks + [self.turn] if task is not None]
+            for task in pending:
+                task.cancel()
+            # Let a cancelled turn finish its quota refund before the connection goes away
+            await asyncio.wait(pending)
+            try:
+                await self.websocket.close()
+            except (RuntimeError, WebSocketDisconnect):
+                pass  # Already closed by the client
+
+    async def send(self, message: dict):
+        """Queue a frame; waits while the client is behind"""
+        await self.outbox.put(message)
+
+    async def _send_loop(self):
+        while True:
+            message = await self.outbox.get()
+            try:
+                await self.websocket.send_json(message)
+            except (RuntimeError, WebSocketDisconnect):
+                return
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(WS_HEARTBEAT_INTERVAL)
+            if time.monotonic() - self.last_seen > WS_IDLE_TIMEOUT:
+                return
+            await self.send({"type": "ping"})
+
+    async def _receive_loop(self):
+        while True:
+            try:
+                data = json.loads(await self.websocket.receive_text())
+            except WebSocketDisconnect:
+                return
+            except ValueError:
+                await self.send({"type": "error", "detail": "Invalid request"})
+                continue
+            self.last_seen = time.monotonic()
+
+            message_type = data.get("type", "query") if isinstance(data, dict) else None
+            if message_type == "ping":
+                await self.send({"type": "pong"})
+            elif message_type == "pong":
+                continue
+            elif message_type == "query" and isinstance(data.get("query"), str):
+                if self.turn is not None and not self.turn.done():
+                    await self.send({"type": "error", "detail": "Please wait for the current reply to finish"})
+                    continue
+                self.turn = asyncio.create_task(self._answer(data["query"]))
+            else:
+                await self.send({"type": "error", "detail": "Invalid request"})
+
+    async def _answer(self, user_query: str):
+        """Answer one query, streaming tokens as they arrive"""
+        query_type = classify_query(user_query)
+
+        reply = quick_reply(user_query, query_type)
+        if reply is not None:
+            await self.send({"type": "done", **reply, "session_id": self.session_id})
+            return
+
+        prompt_tokens = count_tokens(user_query)
+        if prompt_tokens > MAX_TOKENS_PER_DAY:
+            await self.send({"type": "done", "response": QUERY_TOO_LONG_REPLY, "session_id": self.session_id})
+            return
+
+        # Streamed tokens can't be taken back, so the prompt and the largest possible
+        # reply are reserved up front (within the limit) and the unused part refunded after
+        # Refunds go to the counter that was charged, even if the reply crosses midnight
+        key = quota_key(self.session_id)
+        reserved = prompt_tokens + WS_MAX_REPLY_TOKENS
+        within_limit, _ = await to_thread(shared_state.incr_within, key, reserved, MAX_TOKENS_PER_DAY, ttl=QUOTA_TTL)
+        if not within_limit:
+            await self.send({"type": "done", "response": DAILY_LIMIT_REPLY, "session_id": self.session_id, "query_type": query_type})
+            return
+
+        cache_key = reply_cache_key(user_query, query_type)
+        cached_reply = await to_thread(shared_state.cache_get, cache_key) if settings.RESPONSE_CACHE_TTL else None
+        if cached_reply is not None:
+            await self._refund(key, reserved - prompt_tokens - count_tokens(cached_reply))
+            await self.send({"type": "done", "response": cached_reply, "session_id": self.session_id, "query_type": query_type})
+            return
+
+        await self.send({"type": "start", "session_id": self.session_id, "query_type": query_type})
+        parts = []
+        failed = False
+        try:
+            stream = await async_client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=build_chat_messages(user_query, query_type),
+                temperature=0.3,
+                max_tokens=WS_MAX_REPLY_TOKENS,
+                stream=True
+            )
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    await self.send({"type": "token", "content": delta})
+        except Exception as e:
+            print(f"OpenAI API error: {e}")
+            failed = True
+        finally:
+            # Also runs when the turn is cancelled (client left mid-stream), which except Exception misses
+            await self._refund(key, reserved if failed else reserved - prompt_tokens - count_tokens("".join(parts)))
+
+        if failed:
+            await self.send({"type": "done", "response": ERROR_REPLY, "session_id": self.session_id})
+            return
+
+        bot_reply = "".join(parts)
+        if settings.RESPONSE_CACHE_TTL:
+            await to_thread(shared_state.cache_set, cache_key, bot_reply, settings.RESPONSE_CACHE_TTL)
+        await self.send({
+            "type": "done",
+            "response": bot_reply,
+            "session_id": self.session_id,
+            "query_type": query_type
+        })
+
+    async def _refund(self, key: str, tokens: int):
+        """Give back the unused part of a reservation on counter key (never charges more)"""
+        if tokens > 0:
+            await to_thread(shared_state.incr, key, -tokens, ttl=QUOTA_TTL)
+
+@app.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket):
+    # CORSMiddleware doesn't cover WebSockets, so check the origin here
+    origin = websocket.headers.get("origin")
+    if origin is not None and origin not in origins:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    session_id = websocket.query_params.get("session_id") or "anonymous"
+    await ChatConnection(websocket, session_id).run()
+
 # Health check endpoint
 @app.get("/health")
 def health_check():
@@ -268,11 +512,11 @@ def health_check():
 # Token usage endpoint
 @app.get("/api/tokens/{session_id}")
 def get_token_usage(session_id: str):
-    user_data = user_tokens.get(session_id, {"count": 0, "date": datetime.now().date()})
+    tokens_used = shared_state.get_int(quota_key(session_id))
     return {
-        "tokens_used": user_data["count"],
-        "tokens_remaining": MAX_TOKENS_PER_DAY - user_data["count"],
-        "date": str(user_data["date"])
+        "tokens_used": tokens_used,
+        "tokens_remaining": MAX_TOKENS_PER_DAY - tokens_used,
+        "date": str(datetime.now().date())
     }
 
 @app.options("/")
@@ -0,0 +1,304 @@
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Attribute vocabularies - each entry owns one bit in the uint32 masks below
+COLORS = [
+    "black", "white", "navy", "blue", "grey", "red", "green", "beige",
+    "brown", "pink", "yellow", "olive", "maroon", "khaki", "cream", "purple",
+    "orange", "teal",
+]
+COLOR_ALIASES = {"gray": "grey", "off-white": "cream", "ivory": "cream"}
+SIZES = ["XS", "S", "M", "L", "XL", "XXL", "XXXL"]
+SIZE_ALIASES = {"small": "S", "medium": "M", "large": "L", "2xl": "XXL", "3xl": "XXXL"}
+
+CURRENCY_SYMBOLS = {"INR": "₹", "USD": "$", "EUR": "€", "GBP": "£"}
+_SYMBOL_CURRENCIES = {"₹": "INR", "rs": "INR", "inr": "INR", "$": "USD", "€": "EUR", "£": "GBP"}
+
+_NUMBER_RE = re.compile(r"\d[\d,]*(?:\.\d+)?")
+_AMOUNT = r"(?:₹|rs\.?|inr|\$)?\s*(\d[\d,]*(?:\.\d+)?)"
+_MAX_PRICE_RE = re.compile(r"\b(?:under|below|less than|up ?to|within|max(?:imum)?|cheaper than)\s*" + _AMOUNT)
+_MIN_PRICE_RE = re.compile(r"\b(?:over|above|more than|at least|min(?:imum)?|starting at)\s*" + _AMOUNT)
+_BETWEEN_RE = re.compile(r"\bbetween\s*" + _AMOUNT + r"\s*(?:and|to|-)\s*" + _AMOUNT)
+_SIZE_RE = re.compile(r"\bsize\s+(xxxl|xxl|xl|xs|s|m|l|small|medium|large|2xl|3xl)\b|\b(xxxl|xxl|xl|xs|2xl|3xl)\b")
+_WORD_RE = re.compile(r"[a-z\-]+")
+
+SORTABLE_COLUMNS = ("price", "category", "in_stock")
+
+
+def parse_price(value: Any) -> Optional[float]:
+    """Parse a display price such as "₹2,499" or "Rs. 1,999.00" into a float"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER_RE.search(str(value))
+    if not match:
+        return None
+    return float(match.group(0).replace(",", ""))
+
+
+def parse_currency(value: Any, default: str = "INR") -> str:
+    """Guess the currency code from a display price string"""
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        for symbol, code in _SYMBOL_CURRENCIES.items():
+            if lowered.startswith(symbol):
+                return code
+    return default
+
+
+def _as_list(value: Any) -> List[str]:
+    """Normalize an attribute value (string, comma list or JSON list) into a list"""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return [str(v) for v in value]
+    return [part for part in re.split(r"[,/|]", str(value)) if part.strip()]
+
+
+def _normalize_color(value: str) -> Optional[str]:
+    color = value.strip().lower()
+    color = COLOR_ALIASES.get(color, color)
+    return color if color in COLORS else None
+
+
+def _normalize_size(value: str) -> Optional[str]:
+    size = value.strip().lower()
+    size = SIZE_ALIASES.get(size, size).upper()
+    return size if size in SIZES else None
+
+
+def color_mask(colors: Iterable[str]) -> int:
+    """Bitmask for a set of color names (unknown colors are ignored)"""
+    mask = 0
+    for color in colors:
+        normalized = _normalize_color(color)
+        if normalized:
+            mask |= 1 << COLORS.index(normalized)
+    return mask
+
+
+def size_mask(sizes: Iterable[str]) -> int:
+    """Bitmask for a set of size labels (unknown sizes are ignored)"""
+    mask = 0
+    for size in sizes:
+        normalized = _normalize_size(size)
+        if normalized:
+            mask |= 1 << SIZES.index(normalized)
+    return mask
+
+
+def _colors_in_text(text: str) -> List[str]:
+    """Colors mentioned as whole words in free text"""
+    found = []
+    for word in _WORD_RE.findall(text.lower()):
+        color = _normalize_color(word)
+        if color and color not in found:
+            found.append(color)
+    return found
+
+
+def _normalize_category(value: Optional[str]) -> str:
+    return (value or "uncategorized").strip().lower()
+
+
+class CatalogSnapshot:
+    """Immutable columnar view of the product catalog for vectorized filtering"""
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        """Build the column arrays from normalized product records"""
+        self.records = records
+        self.categories: List[str] = sorted({r["category"] for r in records})
+        self._category_codes = {name: code for code, name in enumerate(self.categories)}
+
+        self.price = np.array(
+            [r["price"] if r["price"] is not None else np.nan for r in records],
+            dtype=np.float64
+        )
+        self.category = np.array([self._category_codes[r["category"]] for r in records], dtype=np.int32)
+        self.in_stock = np.array([r["in_stock"] for r in records], dtype=bool)
+        self.color_mask = np.array([color_mask(r["colors"]) for r in records], dtype=np.uint32)
+        self.size_mask = np.array([size_mask(r["sizes"]) for r in records], dtype=np.uint32)
+
+        for array in (self.price, self.category, self.in_stock, self.color_mask, self.size_mask):
+            array.setflags(write=False)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @classmethod
+    def from_static_data(cls, static_products: Dict[str, Any]) -> "CatalogSnapshot":
+        """Build a snapshot from the STATIC_DATA["products"] section (one list per category)"""
+        records = []
+        for category, items in static_products.items():
+            if isinstance(items, list):
+                records.extend(cls._normalize_record(item, category) for item in items)
+        return cls(records)
+
+    @staticmethod
+    def _normalize_record(item: Dict[str, Any], category: Optional[str] = None) -> Dict[str, Any]:
+        """Parse price and attributes of a single product once, at load time"""
+        def attribute(*keys):
+            for key in keys:
+                if item.get(key) is not None:
+                    return item[key]
+            return None
+
+        colors = [c for c in (_normalize_color(v) for v in _as_list(attribute("colors", "color"))) if c]
+        if not colors:
+            colors = _colors_in_text(f"{item.get('name', '')} {item.get('description') or ''}")
+        sizes = [s for s in (_normalize_size(v) for v in _as_list(attribute("sizes", "size"))) if s]
+
+        raw_price = item.get("price")
+        return {
+            "id": item.get("id"),
+            "name": item.get("name", ""),
+            "description": item.get("description") or "",
+            "price": parse_price(raw_price),
+            "currency": parse_currency(raw_price, item.get("currency") or "INR"),
+            "category": _normalize_category(category or item.get("category")),
+            "in_stock": bool(item.get("in_stock", True)),
+            "colors": colors,
+            "sizes": sizes,
+            "url": item.get("url", ""),
+            "image_url": item.get("image_url"),
+        }
+
+    def category_code(self, name: str) -> Optional[int]:
+        """Code of a category name, accepting singular forms ("shirt" for "shirts")"""
+        name = _normalize_category(name)
+        if name in self._category_codes:
+            return self._category_codes[name]
+        for category, code in self._category_codes.items():
+            if category.rstrip("s") == name.rstrip("s"):
+                return code
+        return None
+
+    def filter(
+        self,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        colors: Optional[List[str]] = None,
+        sizes: Optional[List[str]] = None,
+        in_stock_only: bool = False
+    ) -> np.ndarray:
+        """Return the row indices matching every given constraint"""
+        mask = np.ones(len(self), dtype=bool)
+        if category is not None:
+            code = self.category_code(category)
+            if code is None:
+                return np.empty(0, dtype=np.intp)
+            mask &= self.category == code
+        # NaN prices compare False, so unpriced rows drop out of price filters
+        if min_price is not None:
+            mask &= self.price >= min_price
+        if max_price is not None:
+            mask &= self.price <= max_price
+        if colors:
+            mask &= (self.color_mask & np.uint32(color_mask(colors))) != 0
+        if sizes:
+            # Rows without size data drop out too - a size can't be promised without it
+            mask &= (self.size_mask & np.uint32(size_mask(sizes))) != 0
+        if in_stock_only:
+            mask &= self.in_stock
+        return np.flatnonzero(mask)
+
+    def sort(self, indices: np.ndarray, by: str = "price", descending: bool = False) -> np.ndarray:
+        """Order row indices by a sortable column (unpriced rows last, ties keep catalog order)"""
+        if by not in SORTABLE_COLUMNS:
+            raise ValueError(f"Cannot sort by {by!r}; expected one of {', '.join(SORTABLE_COLUMNS)}")
+        # As float64 so bool columns can be negated; NaN stays NaN and sorts last either way
+        column = getattr(self, by)[indices].astype(np.float64)
+        if descending:
+            column = -column
+        return indices[np.argsort(column, kind="stable")]
+
+    def query(self, limit: Optional[int] = None, sort_by: Optional[str] = "price", descending: bool = False, **filters) -> List[Dict[str, Any]]:
+        """Filter, sort and materialize matching product records"""
+        indices = self.filter(**filters)
+        if sort_by:
+            indices = self.sort(indices, by=sort_by, descending=descending)
+        if limit is not None:
+            indices = indices[:limit]
+        return [self.records[i] for i in indices]
+
+    def parse_filters(self, user_query: str) -> Optional[Dict[str, Any]]:
+        """
+        Extract structured filters from a shopping question.
+        Returns None when the query has no price, color or size constraint.
+        """
+        lc = user_query.lower()
+        filters: Dict[str, Any] = {}
+
+        def amount(match, group=1):
+            return float(match.group(group).replace(",", ""))
+
+        between = _BETWEEN_RE.search(lc)
+        if between:
+            filters["min_price"] = amount(between, 1)
+            filters["max_price"] = amount(between, 2)
+        else:
+            max_match = _MAX_PRICE_RE.search(lc)
+            min_match = _MIN_PRICE_RE.search(lc)
+            if max_match:
+                filters["max_price"] = amount(max_match)
+            if min_match:
+                filters["min_price"] = amount(min_match)
+
+        colors = _colors_in_text(lc)
+        if colors:
+            filters["colors"] = colors
+
+        sizes = []
+        for match in _SIZE_RE.finditer(lc):
+            size = _normalize_size(match.group(1) or match.group(2))
+            if size and size not in sizes:
+                sizes.append(size)
+        if sizes:
+            filters["sizes"] = sizes
+
+        if not filters:
+            return None
+
+        if "in stock" in lc or "available" in lc:
+            filters["in_stock_only"] = True
+        for word in _WORD_RE.findall(lc):
+            if self.category_code(word) is not None:
+                filters["category"] = word
+                break
+        return filters
+
+
+class CatalogStore:
+    """Holds the current snapshot and swaps it atomically on catalog sync"""
+
+    def __init__(self):
+        self._snapshot = CatalogSnapshot([])
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        """Current snapshot - read it once per request so a swap can't split a query"""
+        return self._snapshot
+
+    def swap(self, snapshot: CatalogSnapshot) -> CatalogSnapshot:
+        """Publish a new snapshot and return the previous one"""
+        with self._lock:
+            previous, self._snapshot = self._snapshot, snapshot
+        return previous
+
+
+def format_price(record: Dict[str, Any]) -> str:
+    """Display price for a snapshot record, e.g. "₹2,499" """
+    if record["price"] is None:
+        return "Price on request"
+    symbol = CURRENCY_SYMBOLS.get(record["currency"], f"{record['currency']} ")
+    return f"{symbol}{record['price']:,.0f}"
+
+
+# Export the instance
+catalog_store = CatalogStore()
@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import case, delete, func
+from sqlmodel import Session, select
+
+from ..config import settings
+from ..database.database import create_tables, engine
+from ..database.models import ChatSession, ChatSessionArchive
+
+SUMMARY_TEXT_LIMIT = 200
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def _database_bytes() -> int:
+    """Current size of the SQLite database in bytes (page_count * page_size)"""
+    with engine.connect() as connection:
+        page_count = connection.exec_driver_sql("PRAGMA page_count").scalar()
+        page_size = connection.exec_driver_sql("PRAGMA page_size").scalar()
+    return page_count * page_size
+
+
+def _truncate(text: Optional[str]) -> str:
+    text = (text or "").strip()
+    return text if len(text) <= SUMMARY_TEXT_LIMIT else text[:SUMMARY_TEXT_LIMIT - 1] + "…"
+
+
+def summarize_messages(messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Extractive summary kept in place of a compacted session's full history"""
+    user_messages = [m for m in messages if m.get("role") == "user"]
+    assistant_messages = [m for m in messages if m.get("role") == "assistant"]
+    tokens = sum(
+        m.get("metadata", {}).get("tokens_used", {}).get("total", 0)
+        for m in assistant_messages
+        if isinstance(m.get("metadata"), dict)
+    )
+    return {
+        "message_count": len(messages),
+        "user_messages": len(user_messages),
+        "first_user_message": _truncate(user_messages[0]["content"]) if user_messages else "",
+        "last_user_message": _truncate(user_messages[-1]["content"]) if user_messages else "",
+        "last_assistant_message": _truncate(assistant_messages[-1]["content"]) if assistant_messages else "",
+        "tokens_used": tokens,
+        "started_at": messages[0].get("timestamp") if messages else None,
+        "ended_at": messages[-1].get("timestamp") if messages else None,
+    }
+
+
+def _in_batches(step: Callable[[Session], int], batch_size: int, max_batches: int, pause: float) -> int:
+    """
+    Run a step one short write transaction at a time.
+    Each call handles at most batch_size rows and commits, so the write lock is
+    released between batches and live traffic can interleave.
+    """
+    total = 0
+    for _ in range(max_batches):
+        with Session(engine) as db_session:
+            handled = step(db_session)
+            db_session.commit()
+        total += handled
+        if handled < batch_size:
+            break
+        time.sleep(pause)
+    return total
+
+
+def expire_sessions(retention_days: int, batch_size: int, max_batches: int, pause: float) -> Dict[str, int]:
+    """Delete sessions and archives whose last activity is older than the retention window"""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    removed = {}
+    for model in (ChatSession, ChatSessionArchive):
+        def step(db_session: Session, model=model) -> int:
+            ids = db_session.exec(
+                select(model.id).where(model.last_activity < cutoff).limit(batch_size)
+            ).all()
+            if ids:
+                db_session.execute(delete(model).where(model.id.in_(ids)))
+            return len(ids)
+
+        removed[model.__tablename__] = _in_batches(step, batch_size, max_batches, pause)
+    return removed
+
+
+def compact_sessions(idle_days: int, batch_size: int, max_batches: int, pause: float) -> int:
+    """Replace idle sessions with a summarized ChatSessionArchive row"""
+    cutoff = datetime.utcnow() - timedelta(days=idle_days)
+
+    def step(db_session: Session) -> int:
+        chat_sessions = db_session.exec(
+            select(ChatSession).where(ChatSession.last_activity < cutoff).limit(batch_size)
+        ).all()
+        for chat_session in chat_sessions:
+            try:
+                messages = chat_session.get_messages()
+            except ValueError:
+                messages = []
+            db_session.add(ChatSessionArchive(
+                session_id=chat_session.session_id,
+                user_id=chat_session.user_id,
+                summary=json.dumps(summarize_messages(messages)),
+                message_count=len(messages),
+                created_at=chat_session.created_at,
+                last_activity=chat_session.last_activity
+            ))
+            db_session.delete(chat_session)
+        return len(chat_sessions)
+
+    return _in_batches(step, batch_size, max_batches, pause)
+
+
+def trim_histories(max_messages: int, batch_size: int, max_batches: int, pause: float) -> int:
+    """Keep only the newest max_messages entries of each session's history"""
+    last_id = 0
+
+    def step(db_session: Session) -> int:
+        nonlocal last_id
+        chat_sessions = db_session.exec(
+            select(ChatSession)
+            .where(ChatSession.id > last_id)
+            # CASE keeps json_array_length off malformed rows (it raises on them); those are left alone
+            .where(case(
+                (func.json_valid(ChatSession.messages), func.json_array_length(ChatSession.messages)),
+                else_=0
+            ) > max_messages)
+            .order_by(ChatSession.id)
+            .limit(batch_size)
+        ).all()
+        for chat_session in chat_sessions:
+            messages = chat_session.get_messages()
+            chat_session.messages = json.dumps(messages[-max_messages:])
+            chat_session.updated_at = datetime.utcnow()
+            db_session.add(chat_session)
+            last_id = chat_session.id
+        return len(chat_sessions)
+
+    return _in_batches(step, batch_size, max_batches, pause)
+
+
+def incremental_vacuum(pages_per_step: int, max_batches: int, pause: float) -> int:
+    """Return free pages to the filesystem in small steps; returns pages released"""
+    with engine.connect() as connection:
+        if connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() != AUTO_VACUUM_INCREMENTAL:
+            print("⚠️  Incremental vacuum is off for this database. Run maintenance with --convert-vacuum once, off-peak.")
+            return 0
+        # execute() steps a row-less PRAGMA only once (one page); executescript runs it to completion
+        driver_connection = connection.connection.driver_connection
+        free_before = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+        for _ in range(max_batches):
+            if not connection.exec_driver_sql("PRAGMA freelist_count").scalar():
+                break
+            connection.commit()
+            driver_connection.executescript(f"PRAGMA incremental_vacuum({pages_per_step})")
+            time.sleep(pause)
+        free_after = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+        # Refresh planner statistics only where they are stale
+        connection.exec_driver_sql("PRAGMA optimize")
+        connection.commit()
+    return free_before - free_after
+
+
+def convert_to_incremental_vacuum() -> int:
+    """
+    One-off switch of an existing database to auto_vacuum=INCREMENTAL.
+    Needs a full VACUUM, which locks the database - run it off-peak.
+    """
+    before = _database_bytes()
+    # VACUUM cannot run inside a transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        connection.exec_driver_sql("VACUUM")
+    return before - _database_bytes()
+
+
+def ensure_schema():
+    """Create the archive table and the last_activity index on existing databases"""
+    create_tables()
+    for index in ChatSession.__table__.indexes:
+        index.create(engine, checkfirst=True)
+
+
+def run_maintenance(
+    retention_days: int = settings.SESSION_RETENTION_DAYS,
+    compact_after_days: int = settings.SESSION_COMPACT_AFTER_DAYS,
+    max_messages: int = settings.MAX_STORED_MESSAGES,
+    batch_size: int = settings.MAINTENANCE_BATCH_SIZE,
+    max_batches: int = settings.MAINTENANCE_MAX_BATCHES,
+    pause: float = settings.MAINTENANCE_PAUSE
+) -> Dict[str, Any]:
+    """Run one full maintenance pass and report what was removed and reclaimed"""
+    started = time.perf_counter()
+    ensure_schema()
+    size_before = _database_bytes()
+
+    expired = expire_sessions(retention_days, batch_size, max_batches, pause)
+    compacted = compact_sessions(compact_after_days, batch_size, max_batches, pause) if compact_after_days > 0 else 0
+    trimmed = trim_histories(max_messages, batch_size, max_batches, pause) if max_messages > 0 else 0
+    vacuumed_pages = incremental_vacuum(settings.VACUUM_PAGES_PER_STEP, max_batches, pause)
+
+    size_after = _database_bytes()
+    return {
+        "expired_sessions": expired[ChatSession.__tablename__],
+        "expired_archives": expired[ChatSessionArchive.__tablename__],
+        "compacted_sessions": compacted,
+        "trimmed_sessions": trimmed,
+        "vacuumed_pages": vacuumed_pages,
+        "bytes_before": size_before,
+        "bytes_after": size_after,
+        "reclaimed_bytes": size_before - size_after,
+        "duration_seconds": round(time.perf_counter() - started, 3),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+async def maintenance_loop(interval: int = settings.MAINTENANCE_INTERVAL):
+    """Run maintenance forever in a worker thread, e.g. as a FastAPI startup task"""
+    while True:
+        try:
+            report = await asyncio.to_thread(run_maintenance)
+            print(f"🧹 Session maintenance: {report}")
+        except Exception as e:
+            print(f"❌ Session maintenance error: {str(e)}")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Expire, compact and vacuum chat sessions")
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    parser.add_argument("--convert-vacuum", action="store_true", help="Switch the database to incremental vacuum (full VACUUM)")
+    args = parser.parse_args()
+
+    if args.convert_vacuum:
+        print(f"Reclaimed {convert_to_incremental_vacuum()} bytes while converting to incremental vacuum")
+    if args.once:
+        print(json.dumps(run_maintenance(), indent=2))
+    elif not args.convert_vacuum:
+        asyncio.run(maintenance_loop())
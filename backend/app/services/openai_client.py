@@ -1,8 +1,10 @@
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime
 from openai import AsyncOpenAI
 
+from .prompts import CompiledPrompt, conversation_messages
+
 class OpenAIClient:
     """OpenAI client wrapper for GPT-4o-mini integration"""
     
@@ -13,6 +15,8 @@ class OpenAIClient:
         self.max_tokens = int(os.getenv("OPENAI_MAX_TOKENS", 1000))
         self.temperature = float(os.getenv("OPENAI_TEMPERATURE", 0.7))
         self.system_prompt = "You are a helpful shopping assistant."  # Customizable
+        # Constant prefix; product context goes after the history so the prefix stays cacheable
+        self.prompt_prefix = CompiledPrompt([{"role": "system", "content": self.system_prompt}])
         
         if not self.api_key:
             print("⚠️ WARNING: OPENAI_API_KEY not found. Using mock mode.")
@@ -40,10 +44,13 @@ class OpenAIClient:
             }
         
         # Build messages for OpenAI
-        messages = [{"role": "system", "content": self._build_system_prompt(product_context)}]
-        if conversation_history:
-            messages.extend(conversation_history[-10:])  # Limit history
-        messages.append({"role": "user", "content": user_message})
+        messages = conversation_messages(
+            self.prompt_prefix,
+            conversation_history,
+            user_message,
+            context=self._build_product_context(product_context),
+            max_history=10  # Limit history
+        )
         
         try:
             response = await self.client.chat.completions.create(
@@ -54,13 +61,15 @@ class OpenAIClient:
             )
             ai_response = response.choices[0].message.content
             usage = response.usage
-            cost_estimate = (usage.prompt_tokens * 0.00000015) + (usage.completion_tokens * 0.0000006)  # gpt-4o-mini pricing
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached_tokens = getattr(details, "cached_tokens", None) or 0
+            cost_estimate = ((usage.prompt_tokens - cached_tokens) * 0.00000015) + (cached_tokens * 0.000000075) + (usage.completion_tokens * 0.0000006)  # gpt-4o-mini pricing, cached input at half price
             
             return {
                 "response": ai_response,
                 "metadata": {
                     "model": self.model,
-                    "tokens_used": {"prompt": usage.prompt_tokens, "completion": usage.completion_tokens, "total": usage.total_tokens},
+                    "tokens_used": {"prompt": usage.prompt_tokens, "cached": cached_tokens, "completion": usage.completion_tokens, "total": usage.total_tokens},
                     "cost_estimate": round(cost_estimate, 6),
                     "timestamp": datetime.utcnow().isoformat()
                 }
@@ -77,11 +86,10 @@ class OpenAIClient:
                 }
             }
     
-    def _build_system_prompt(self, product_context: List[Dict] = None) -> str:
-        prompt = self.system_prompt
-        if product_context:
-            prompt += "\nProduct context:\n" + "\n".join([f"- {p['name']}: {p['description']}" for p in product_context])
-        return prompt
+    def _build_product_context(self, product_context: List[Dict] = None) -> Optional[str]:
+        if not product_context:
+            return None
+        return "Product context:\n" + "\n".join([f"- {p['name']}: {p['description']}" for p in product_context])
 
 # Export the instance
 openai_client = OpenAIClient()
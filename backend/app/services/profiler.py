@@ -0,0 +1,268 @@
+import asyncio
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI
+
+from ..config import settings
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+# Leaf frames in these modules are idle waits, not handler work
+_IDLE_MODULES = ("threading.py", "queue.py", "selectors.py", "base_events.py")
+
+Frame = Tuple[str, str, int]
+
+# Sampler of the request being handled in this context (copied into to_thread workers)
+_active_sampler: ContextVar[Optional["StackSampler"]] = ContextVar("active_sampler", default=None)
+
+
+class StackSampler(threading.Thread):
+    """Background thread that samples the Python stacks of the threads serving one request"""
+
+    def __init__(self, interval: float, thread_id: int):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        thread = next((t for t in threading.enumerate() if t.ident == thread_id), None)
+        self._threads: Dict[int, str] = {thread_id: thread.name if thread else f"thread-{thread_id}"}
+
+    def watch(self, thread_id: int, name: str):
+        """Sample another thread (a worker running part of the request) until unwatch"""
+        with self._lock:
+            self._threads[thread_id] = name
+
+    def unwatch(self, thread_id: int):
+        with self._lock:
+            self._threads.pop(thread_id, None)
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                threads = list(self._threads.items())
+            frames = sys._current_frames()
+            for thread_id, name in threads:
+                frame = frames.get(thread_id)
+                stack: List[Frame] = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                if not stack or os.path.basename(stack[0][1]) in _IDLE_MODULES:
+                    continue
+                stack.append((name, "", 0))
+                self.samples[tuple(reversed(stack))] += 1
+
+    def stop(self) -> Counter:
+        """Stop sampling and return {stack: sample count}"""
+        self._stopped.set()
+        self.join()
+        return self.samples
+
+
+def _frame_label(frame: Frame) -> str:
+    name, filename, line = frame
+    return f"{name} ({os.path.basename(filename)}:{line})" if filename else name
+
+
+def to_collapsed(samples: Counter) -> str:
+    """Brendan Gregg collapsed-stack format (flamegraph.pl, speedscope, inferno)"""
+    lines = [";".join(_frame_label(f) for f in stack) + f" {count}" for stack, count in samples.most_common()]
+    return "\n".join(lines) + "\n"
+
+
+def to_speedscope(samples: Counter, name: str, interval: float) -> Dict:
+    """speedscope.app "sampled" profile with one weighted sample per distinct stack"""
+    frames: List[Dict] = []
+    frame_index: Dict[Frame, int] = {}
+    stacks, weights = [], []
+    for stack, count in samples.items():
+        indices = []
+        for frame in stack:
+            if frame not in frame_index:
+                frame_index[frame] = len(frames)
+                frames.append({"name": frame[0], "file": frame[1], "line": frame[2]} if frame[1] else {"name": frame[0]})
+            indices.append(frame_index[frame])
+        stacks.append(indices)
+        weights.append(count * interval)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "caviaar-profiler",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": stacks,
+            "weights": weights
+        }]
+    }
+
+
+class RequestProfiler:
+    """
+    Opt-in per-request profiling.
+    A request is profiled when it carries an X-Profile header matching
+    PROFILE_TOKEN, or when it falls in the PROFILE_SAMPLE_RATE sample.
+    Results go to PROFILE_DIR, which keeps only the newest PROFILE_MAX_FILES profiles.
+
+    The thread that starts the profile is sampled (the event loop for the
+    async handlers in main.py), plus the worker threads running the
+    request's blocking calls made through to_thread() below, such as
+    shared-state SQLite work and lock waits. Other requests the loop serves
+    meanwhile appear in the same profile. Calls made with plain
+    asyncio.to_thread and sync (def) handlers in the threadpool are not captured.
+    """
+
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        sample_rate: Optional[float] = None,
+        interval: Optional[float] = None,
+        directory: Optional[str] = None,
+        max_profiles: Optional[int] = None
+    ):
+        # Unset arguments fall back to settings at construction, not at import
+        self.token = (settings.PROFILE_TOKEN if token is None else token).encode()
+        self.sample_rate = settings.PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.interval = settings.PROFILE_INTERVAL if interval is None else interval
+        self.directory = settings.PROFILE_DIR if directory is None else directory
+        self.max_profiles = settings.PROFILE_MAX_FILES if max_profiles is None else max_profiles
+        self._write_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token) or self.sample_rate > 0
+
+    def should_profile(self, scope: dict) -> bool:
+        """Cheap per-request check: sample rate first, then the auth header"""
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return True
+        if self.token:
+            for key, value in scope.get("headers", ()):
+                if key == PROFILE_HEADER:
+                    return hmac.compare_digest(value, self.token)
+        return False
+
+    def start(self) -> StackSampler:
+        """Start sampling the calling thread"""
+        sampler = StackSampler(self.interval, threading.get_ident())
+        sampler.start()
+        return sampler
+
+    def profile_id(self, scope: dict) -> str:
+        path = re.sub(r"[^A-Za-z0-9]+", "-", scope.get("path", "")).strip("-") or "root"
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        return f"{stamp}-{scope.get('method', 'WS')}-{path[:60]}-{os.getpid()}"
+
+    def write(self, profile_id: str, samples: Counter, duration: float):
+        """Write collapsed and speedscope files, then trim the ring"""
+        if not samples:
+            return
+        name = f"{profile_id} ({duration * 1000:.1f} ms)"
+        with self._write_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory, profile_id)
+            with open(base + ".collapsed.txt", "w", encoding="utf-8") as f:
+                f.write(to_collapsed(samples))
+            with open(base + ".speedscope.json", "w", encoding="utf-8") as f:
+                json.dump(to_speedscope(samples, name, self.interval), f)
+            self._trim()
+
+    def _trim(self):
+        """Drop the oldest profiles beyond max_profiles"""
+        profiles: Dict[str, List[str]] = {}
+        for filename in os.listdir(self.directory):
+            profiles.setdefault(filename.split(".", 1)[0], []).append(filename)
+        # Ids start with a UTC timestamp, so they sort oldest first
+        for profile_id in sorted(profiles)[:-self.max_profiles or None]:
+            for filename in profiles[profile_id]:
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass  # Removed by another worker
+
+    async def finish(self, sampler: StackSampler, profile_id: str, started: float):
+        """Stop sampling and write the profile off the event loop"""
+        duration = time.perf_counter() - started
+        samples = sampler.stop()
+        try:
+            await asyncio.to_thread(self.write, profile_id, samples, duration)
+        except OSError as e:
+            print(f"❌ Profile write error: {str(e)}")
+
+
+class ProfilerMiddleware:
+    """ASGI middleware profiling selected HTTP requests; others pass straight through"""
+
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = self.profiler.profile_id(scope)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append((PROFILE_ID_HEADER, profile_id.encode()))
+            await send(message)
+
+        started = time.perf_counter()
+        sampler = self.profiler.start()
+        token = _active_sampler.set(sampler)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _active_sampler.reset(token)
+            await self.profiler.finish(sampler, profile_id, started)
+
+
+async def to_thread(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    asyncio.to_thread that, inside a profiled request, also samples the
+    worker thread while it runs func
+    """
+    sampler = _active_sampler.get()
+    if sampler is None:
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    def sampled():
+        thread_id = threading.get_ident()
+        sampler.watch(thread_id, threading.current_thread().name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            sampler.unwatch(thread_id)
+
+    return await asyncio.to_thread(sampled)
+
+
+def install_profiler(app: FastAPI, profiler: Optional["RequestProfiler"] = None):
+    """Add the middleware only when profiling is configured, so it costs nothing otherwise"""
+    profiler = profiler or request_profiler
+    if profiler.enabled:
+        app.add_middleware(ProfilerMiddleware, profiler=profiler)
+
+
+# Export the instance
+request_profiler = RequestProfiler()
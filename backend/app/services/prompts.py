@@ -0,0 +1,97 @@
+import json
+from typing import Callable, Dict, Iterable, List, Optional
+
+# Chat-format overhead per message (role and separators), per OpenAI's token counting guide
+TOKENS_PER_MESSAGE = 3
+
+
+class CompiledPrompt:
+    """
+    Constant leading messages of a prompt, rendered and token-counted once.
+    Every request starts with exactly these messages, so the bytes sent
+    upstream share a prefix that provider-side prompt caching can reuse.
+    """
+
+    def __init__(self, messages: List[Dict[str, str]], count_tokens: Optional[Callable[[str], int]] = None):
+        self.messages = tuple(dict(message) for message in messages)
+        self.prefix_tokens: Optional[int] = None
+        if count_tokens is not None:
+            self.prefix_tokens = sum(count_tokens(m["content"]) + TOKENS_PER_MESSAGE for m in self.messages)
+
+    def render(self, *suffix: Dict[str, str]) -> List[Dict[str, str]]:
+        """Prefix messages followed by the per-request messages"""
+        return [*self.messages, *suffix]
+
+
+class PromptLibrary:
+    """
+    Per-query_type prompts for the /api/chat endpoint.
+    Layout, most shared first:
+      1. system - the assistant rules (identical for every request)
+      2. system - query type and its static info (identical per query_type)
+      3. user   - the question (the only per-request part)
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        static_info: Callable[[str], dict],
+        count_tokens: Callable[[str], int]
+    ):
+        self.system_prompt = system_prompt
+        self.static_info = static_info
+        self.count_tokens = count_tokens
+        self._compiled: Dict[str, CompiledPrompt] = {}
+
+    def compile(self, query_types: Iterable[str]) -> "PromptLibrary":
+        """Render every query_type's prefix up front (call at startup)"""
+        for query_type in query_types:
+            self.get(query_type)
+        return self
+
+    def get(self, query_type: str) -> CompiledPrompt:
+        """Compiled prefix for a query_type, compiled on first use if it wasn't at startup"""
+        compiled = self._compiled.get(query_type)
+        if compiled is None:
+            compiled = CompiledPrompt([
+                {"role": "system", "content": self.system_prompt},
+                {"role": "system", "content": f"Query type: {query_type}\nAvailable info: {json.dumps(self.static_info(query_type))}"}
+            ], self.count_tokens)
+            self._compiled[query_type] = compiled
+        return compiled
+
+    def build(self, query_type: str, user_query: str) -> List[Dict[str, str]]:
+        """Messages for one request: the cached prefix plus the user's question"""
+        return self.get(query_type).render({"role": "user", "content": f"User question: {user_query}"})
+
+    def prefix_tokens(self, query_type: str) -> int:
+        return self.get(query_type).prefix_tokens
+
+
+def conversation_messages(
+    prefix: CompiledPrompt,
+    history: Optional[List[Dict]],
+    user_message: str,
+    context: Optional[str] = None,
+    max_history: int = 10
+) -> List[Dict[str, str]]:
+    """
+    Messages for a multi-turn conversation: constant prefix, then history
+    reduced to role/content (so earlier turns are byte-identical next time),
+    then per-request context and the new user message.
+    Old history is dropped in steps of about half the window rather than one
+    message per turn, so the kept history keeps the same start for several turns.
+    Steps are an even number of messages, so the kept history starts on a user turn.
+    """
+    history = history or []
+    step = max(2, max_history // 2 // 2 * 2)
+    overflow = len(history) - max_history
+    start = -(-overflow // step) * step if overflow > 0 else 0
+
+    messages = prefix.render()
+    for message in history[start:]:
+        messages.append({"role": message["role"], "content": message["content"]})
+    if context:
+        messages.append({"role": "system", "content": context})
+    messages.append({"role": "user", "content": user_message})
+    return messages
@@ -0,0 +1,191 @@
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+from ..config import settings
+
+PURGE_EVERY = 1000  # writes between sweeps of expired rows
+
+
+class SharedState(ABC):
+    """
+    Counters and a small TTL cache shared by every worker process.
+    Implementations must make incr/incr_within atomic across processes;
+    a Redis backend would map them to INCRBY and a Lua check-and-incr.
+    """
+
+    @abstractmethod
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Add amount to a counter (created at 0) and return the new value"""
+
+    @abstractmethod
+    def incr_within(self, key: str, amount: int, limit: Optional[int], ttl: Optional[float] = None) -> Tuple[bool, int]:
+        """Add amount only if the result stays within limit (None = no limit); returns (applied, value)"""
+
+    @abstractmethod
+    def get_int(self, key: str) -> int:
+        """Current counter value (0 when missing or expired)"""
+
+    @abstractmethod
+    def cache_get(self, key: str) -> Optional[str]:
+        """Cached value, or None when missing or expired"""
+
+    @abstractmethod
+    def cache_set(self, key: str, value: str, ttl: float):
+        """Store a value for ttl seconds"""
+
+
+class MemorySharedState(SharedState):
+    """In-process backend - only correct with a single worker"""
+
+    def __init__(self):
+        self._counters: Dict[str, Tuple[int, Optional[float]]] = {}
+        self._cache: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _current(self, key: str, now: float) -> int:
+        value, expires_at = self._counters.get(key, (0, None))
+        return 0 if expires_at is not None and expires_at <= now else value
+
+    def _maybe_purge(self, now: float):
+        """Drop expired entries every PURGE_EVERY writes (call with the lock held)"""
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            self._counters = {
+                key: entry for key, entry in self._counters.items()
+                if entry[1] is None or entry[1] > now
+            }
+            self._cache = {key: entry for key, entry in self._cache.items() if entry[1] > now}
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return self.incr_within(key, amount, None, ttl)[1]
+
+    def incr_within(self, key: str, amount: int, limit: Optional[int], ttl: Optional[float] = None) -> Tuple[bool, int]:
+        now = time.time()
+        with self._lock:
+            current = self._current(key, now)
+            if limit is not None and current + amount > limit:
+                return False, current
+            _, expires_at = self._counters.get(key, (0, None))
+            if expires_at is None or expires_at <= now:
+                expires_at = now + ttl if ttl else None
+            self._counters[key] = (current + amount, expires_at)
+            self._maybe_purge(now)
+            return True, current + amount
+
+    def get_int(self, key: str) -> int:
+        with self._lock:
+            return self._current(key, time.time())
+
+    def cache_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value, expires_at = self._cache.get(key, (None, 0.0))
+        return value if expires_at > time.time() else None
+
+    def cache_set(self, key: str, value: str, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._cache[key] = (value, now + ttl)
+            self._maybe_purge(now)
+
+
+class SQLiteSharedState(SharedState):
+    """
+    On-box backend in a WAL-mode SQLite file.
+    Each check-and-write runs in a BEGIN IMMEDIATE transaction, which takes
+    the database write lock up front, so concurrent workers serialize
+    instead of losing updates.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread and process (connections must not cross a fork)"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA synchronous = NORMAL")  # durable enough for counters under WAL
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _maybe_purge(self, connection: sqlite3.Connection, now: float):
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            connection.execute("DELETE FROM counters WHERE expires_at <= ?", (now,))
+            connection.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return self.incr_within(key, amount, None, ttl)[1]
+
+    def incr_within(self, key: str, amount: int, limit: Optional[int], ttl: Optional[float] = None) -> Tuple[bool, int]:
+        connection = self._connect()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT value, expires_at FROM counters WHERE key = ?", (key,)).fetchone()
+            expired = row is None or (row[1] is not None and row[1] <= now)
+            current = 0 if expired else row[0]
+            if limit is not None and current + amount > limit:
+                connection.execute("COMMIT")
+                return False, current
+            expires_at = (now + ttl if ttl else None) if expired else row[1]
+            connection.execute(
+                "INSERT INTO counters (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+                (key, current + amount, expires_at)
+            )
+            self._maybe_purge(connection, now)
+            connection.execute("COMMIT")
+            return True, current + amount
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def get_int(self, key: str) -> int:
+        row = self._connect().execute(
+            "SELECT value FROM counters WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def cache_get(self, key: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def cache_set(self, key: str, value: str, ttl: float):
+        connection = self._connect()
+        now = time.time()
+        connection.execute(
+            "INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, value, now + ttl)
+        )
+        self._maybe_purge(connection, now)
+
+
+def create_shared_state(url: Optional[str] = None) -> SharedState:
+    """Build the backend named by url, or SHARED_STATE_URL (sqlite:///path or memory://)"""
+    url = url or settings.SHARED_STATE_URL
+    if url.startswith("sqlite:///"):
+        return SQLiteSharedState(url[len("sqlite:///"):])
+    if url.startswith("memory://"):
+        return MemorySharedState()
+    raise ValueError(f"Unsupported SHARED_STATE_URL: {url}")
@@ -0,0 +1,155 @@
+"""
+Prompt assembly cost and upstream prompt-cache hit rate.
+
+Run from backend/:  python -m scripts.bench_prompts [--requests 2000]
+
+Compares the legacy layout (prompt rebuilt per request, variable text mixed
+into the first messages) with the compiled, prefix-stable layout from
+app.services.prompts. The mock upstream caches like OpenAI: prefixes of
+1024+ tokens, matched in 128-token blocks against earlier requests.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import timeit
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")  # main builds its clients at import; nothing is sent
+
+from app.main import CHAT_SYSTEM_PROMPT, build_chat_messages, classify_query, encoding, fetch_static_data, prompt_library
+from app.services.prompts import CompiledPrompt, conversation_messages
+
+QUERIES = [
+    "what payment methods do you accept",
+    "how long does shipping take to {city}",
+    "size guide for a {size} shirt",
+    "what is your return policy for {item}",
+    "any offers or discount codes on {item}",
+    "suggest a shirt for a {occasion}",
+    "can I pay with upi for {item}",
+    "is express delivery available in {city}",
+]
+FILL = {
+    "city": ["Mumbai", "Delhi", "Pune", "Jaipur", "Kochi"],
+    "size": ["small", "medium", "large", "XL"],
+    "item": ["my order", "a linen shirt", "trousers", "a gift"],
+    "occasion": ["wedding", "office party", "beach trip", "interview"],
+}
+
+
+def sample_queries(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    return [
+        rng.choice(QUERIES).format(**{k: rng.choice(v) for k, v in FILL.items()})
+        for _ in range(count)
+    ]
+
+
+def legacy_chat_messages(user_query: str, query_type: str) -> list:
+    """The /api/chat prompt as it was built before compiled prefixes"""
+    system_prompt = CHAT_SYSTEM_PROMPT
+    user_prompt = f"Query type: {query_type}\nAvailable info: {json.dumps(fetch_static_data(query_type))}\nUser question: {user_query}"
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def legacy_conversation_messages(system_prompt: str, history: list, user_message: str, context: str) -> list:
+    """OpenAIClient's layout before: product context inside the system prompt, sliding history"""
+    messages = [{"role": "system", "content": system_prompt + "\nProduct context:\n" + context}]
+    messages.extend(history[-10:])
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+
+class MockUpstream:
+    """Chat completions stand-in that reports usage.prompt_tokens_details.cached_tokens"""
+
+    def __init__(self, min_prefix: int = 1024, block: int = 128):
+        self.min_prefix = min_prefix
+        self.block = block
+        self._seen = set()
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def create(self, messages: list) -> dict:
+        text = "".join(f"<|{m['role']}|>{m['content']}<|end|>" for m in messages)
+        tokens = encoding.encode(text)
+
+        cached, digest = 0, b""
+        hashes = []
+        for end in range(self.block, len(tokens) + 1, self.block):
+            digest = hashlib.sha1(digest + repr(tokens[end - self.block:end]).encode()).digest()
+            hashes.append(digest)
+            if digest in self._seen and cached == end - self.block:
+                cached = end
+        self._seen.update(hashes)
+        if len(tokens) < self.min_prefix:
+            cached = 0
+
+        self.prompt_tokens += len(tokens)
+        self.cached_tokens += cached
+        return {"usage": {"prompt_tokens": len(tokens), "prompt_tokens_details": {"cached_tokens": cached}}}
+
+    @property
+    def hit_rate(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+def bench_assembly(queries: list) -> None:
+    typed = [(q, classify_query(q)) for q in queries]
+    for name, build in (("legacy", legacy_chat_messages), ("compiled", build_chat_messages)):
+        seconds = timeit.timeit(lambda: [build(q, t) for q, t in typed], number=5) / 5
+        print(f"  {name:9s} {seconds / len(typed) * 1e6:7.2f} us per prompt")
+
+
+def bench_chat_cache(queries: list, min_prefix: int) -> None:
+    typed = [(q, classify_query(q)) for q in queries]
+    for name, build in (("legacy", legacy_chat_messages), ("compiled", build_chat_messages)):
+        upstream = MockUpstream(min_prefix=min_prefix)
+        for q, t in typed:
+            upstream.create(build(q, t))
+        print(f"  {name:9s} hit rate {upstream.hit_rate:6.1%}  ({upstream.cached_tokens}/{upstream.prompt_tokens} prompt tokens cached)")
+
+
+def bench_conversation_cache(turns: int, min_prefix: int) -> None:
+    system_prompt = "You are a helpful shopping assistant."
+    prefix = CompiledPrompt([{"role": "system", "content": system_prompt}])
+    queries = sample_queries(turns, seed=11)
+    reply = "Here are a few options that match what you asked for, with sizes and prices. " * 10
+
+    for name in ("legacy", "compiled"):
+        upstream = MockUpstream(min_prefix=min_prefix)
+        history = []
+        for turn, query in enumerate(queries):
+            context = "\n".join(f"- Product {turn}-{i}: cotton shirt, regular fit" for i in range(5))
+            if name == "legacy":
+                messages = legacy_conversation_messages(system_prompt, history, query, context)
+            else:
+                messages = conversation_messages(prefix, history, query, context="Product context:\n" + context)
+            upstream.create(messages)
+            history += [{"role": "user", "content": query}, {"role": "assistant", "content": reply}]
+        print(f"  {name:9s} hit rate {upstream.hit_rate:6.1%}  ({upstream.cached_tokens}/{upstream.prompt_tokens} prompt tokens cached)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=30)
+    args = parser.parse_args()
+
+    queries = sample_queries(args.requests)
+    sizes = {t: prompt_library.prefix_tokens(t) for t in sorted({classify_query(q) for q in queries})}
+    print(f"Compiled prefix tokens per query_type: {sizes}")
+
+    print(f"\nAssembly cost, /api/chat ({args.requests} queries)")
+    bench_assembly(queries)
+
+    for min_prefix in (1024, 0):
+        print(f"\n/api/chat prompt cache, minimum cacheable prompt {min_prefix} tokens")
+        bench_chat_cache(queries, min_prefix)
+
+    print(f"\nConversation prompt cache ({args.turns} turns, minimum 1024 tokens)")
+    bench_conversation_cache(args.turns, 1024)
@@ -0,0 +1,80 @@
+"""
+Contended-increment benchmark for the shared-state backends.
+
+Run from backend/:  python -m scripts.bench_shared_state [--processes 8] [--increments 2000]
+
+Every process hammers the same counter, the way uvicorn workers charge one
+hot session's quota. The final value must equal processes * increments.
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from app.services.shared_state import SQLiteSharedState
+
+KEY = "bench:tokens"
+
+
+def _worker(path: str, increments: int, limit, start, results):
+    state = SQLiteSharedState(path)
+    start.wait()
+    began = time.perf_counter()
+    applied = 0
+    for _ in range(increments):
+        if limit is None:
+            state.incr(KEY, 1, ttl=3600)
+            applied += 1
+        elif state.incr_within(KEY, 1, limit, ttl=3600)[0]:
+            applied += 1
+    results.put((applied, time.perf_counter() - began))
+
+
+def run(path: str, processes: int, increments: int, limit=None) -> dict:
+    """Run one contended round and return throughput and correctness figures"""
+    start = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=_worker, args=(path, increments, limit, start, results))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    time.sleep(0.5)  # let every worker open its connection before the gun
+
+    began = time.perf_counter()
+    start.set()
+    outcomes = [results.get() for _ in workers]
+    elapsed = time.perf_counter() - began
+    for worker in workers:
+        worker.join()
+
+    total = sum(applied for applied, _ in outcomes)
+    final = SQLiteSharedState(path).get_int(KEY)
+    return {
+        "applied": total,
+        "final_value": final,
+        "consistent": final == total,
+        "elapsed_s": round(elapsed, 3),
+        "ops_per_s": round(processes * increments / elapsed),
+        "slowest_worker_s": round(max(seconds for _, seconds in outcomes), 3)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--increments", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{args.processes} processes x {args.increments} increments on one key")
+
+        report = run(os.path.join(directory, "incr.db"), args.processes, args.increments)
+        print(f"incr:        {report}")
+
+        limit = args.processes * args.increments // 2
+        report = run(os.path.join(directory, "limit.db"), args.processes, args.increments, limit=limit)
+        report["limit_respected"] = report["final_value"] == limit
+        print(f"incr_within: {report}")
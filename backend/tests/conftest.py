@@ -0,0 +1,5 @@
+import os
+
+# app.main builds its clients and shared state at import; keep tests offline and in memory
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["SHARED_STATE_URL"] = "memory://"
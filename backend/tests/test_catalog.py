@@ -0,0 +1,90 @@
+import pytest
+
+from app import main
+from app.services.catalog import CatalogSnapshot
+
+PRODUCTS = {
+    "shirts": [
+        {"name": "Classic White Shirt", "price": "₹2,499", "url": "white", "sizes": ["S", "M", "L"]},
+        {"name": "Black Formal Shirt", "price": "₹2,799", "url": "black", "sizes": "M, XL, XXL"},
+        {"name": "Navy Striped Shirt", "price": "₹1,999", "url": "navy"},  # no size data
+    ],
+    "trousers": [
+        {"name": "Beige Chinos", "price": "Rs. 1,499", "url": "chinos", "sizes": ["M", "L"], "in_stock": False},
+    ],
+    "redirect": "https://caviaarmode.com/collections/all",
+}
+
+
+@pytest.fixture
+def snapshot():
+    return CatalogSnapshot.from_static_data(PRODUCTS)
+
+
+def names(records):
+    return [r["name"] for r in records]
+
+
+def test_parse_filters_price_bounds(snapshot):
+    assert snapshot.parse_filters("shirts under ₹2,500") == {"max_price": 2500.0, "category": "shirts"}
+    assert snapshot.parse_filters("anything above rs. 2000") == {"min_price": 2000.0}
+    assert snapshot.parse_filters("trousers between 1000 and 2,000") == {
+        "min_price": 1000.0, "max_price": 2000.0, "category": "trousers"
+    }
+
+
+def test_parse_filters_colors_and_sizes(snapshot):
+    assert snapshot.parse_filters("black shirt in size large") == {
+        "colors": ["black"], "sizes": ["L"], "category": "shirt"
+    }
+    assert snapshot.parse_filters("do you have a white shirt in XXL")["sizes"] == ["XXL"]
+    assert snapshot.parse_filters("shirts in stock") is None
+
+
+def test_filter_by_price(snapshot):
+    assert names(snapshot.query(max_price=2500)) == ["Beige Chinos", "Navy Striped Shirt", "Classic White Shirt"]
+    assert names(snapshot.query(min_price=2000, max_price=2600)) == ["Classic White Shirt"]
+    assert names(snapshot.query(max_price=2000, in_stock_only=True)) == ["Navy Striped Shirt"]
+
+
+def test_filter_by_size_skips_rows_without_size_data(snapshot):
+    assert names(snapshot.query(sizes=["XXL"])) == ["Black Formal Shirt"]
+    assert names(snapshot.query(category="shirts", sizes=["L"])) == ["Classic White Shirt"]
+    assert snapshot.query(colors=["navy"], sizes=["M"]) == []
+    assert snapshot.query(sizes=["XXXL"]) == []
+
+
+def test_sort_descending(snapshot):
+    assert names(snapshot.query(sort_by="price", descending=True))[0] == "Black Formal Shirt"
+    # Bool column: in-stock rows first, ties keep catalog order
+    assert names(snapshot.query(sort_by="in_stock", descending=True)) == [
+        "Classic White Shirt", "Black Formal Shirt", "Navy Striped Shirt", "Beige Chinos"
+    ]
+
+
+def test_sort_keeps_unpriced_rows_last():
+    snapshot = CatalogSnapshot.from_static_data({"shirts": [
+        {"name": "On Request", "price": None}, {"name": "Cheap", "price": "₹999"}, {"name": "Dear", "price": "₹4,999"}
+    ]})
+    assert names(snapshot.query(sort_by="price")) == ["Cheap", "Dear", "On Request"]
+    assert names(snapshot.query(sort_by="price", descending=True)) == ["Dear", "Cheap", "On Request"]
+    with pytest.raises(ValueError):
+        snapshot.query(sort_by="records")
+
+
+@pytest.mark.parametrize("query", ["do you have a white shirt in XXL", "Black formal shirt in XXXL please"])
+def test_unverifiable_size_falls_through_to_llm(query):
+    assert main.answer_from_catalog(query, "products") is None
+
+
+@pytest.mark.parametrize("query_type", ["size_guide", "returns", "shipping", "payments"])
+def test_policy_questions_are_never_answered_from_catalog(query_type):
+    assert main.answer_from_catalog("white shirts under 3000", query_type) is None
+
+
+def test_catalog_answer_for_product_search():
+    reply = main.answer_from_catalog("white shirts under 3000", "products")
+    assert names(reply["suggested_products"]) == ["Classic White Cotton Shirt"]
+    # Outside product queries a category word is required
+    assert main.answer_from_catalog("white under 3000", "offers") is None
+    assert main.answer_from_catalog("white shirts under 3000", "offers") is not None
@@ -0,0 +1,35 @@
+import asyncio
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.services.profiler import RequestProfiler, install_profiler, to_thread
+
+
+def blocking_lookup():
+    """Stands in for a shared-state call waiting on the SQLite write lock"""
+    deadline = time.perf_counter() + 0.2
+    while time.perf_counter() < deadline:
+        pass
+    return "value"
+
+
+def test_profile_includes_worker_thread_calls(tmp_path):
+    app = FastAPI()
+
+    @app.get("/lookup")
+    async def lookup():
+        return {"value": await to_thread(blocking_lookup)}
+
+    install_profiler(app, RequestProfiler(token="secret", interval=0.002, directory=str(tmp_path)))
+    response = TestClient(app).get("/lookup", headers={"X-Profile": "secret"})
+
+    assert response.json() == {"value": "value"}
+    profile_id = response.headers["x-profile-id"]
+    collapsed = (tmp_path / f"{profile_id}.collapsed.txt").read_text()
+    assert "blocking_lookup" in collapsed
+
+
+def test_to_thread_outside_a_profile():
+    assert asyncio.run(to_thread(sum, [1, 2, 3])) == 6
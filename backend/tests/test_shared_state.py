@@ -0,0 +1,87 @@
+import multiprocessing
+
+import pytest
+
+from app.services import shared_state as shared_state_module
+from app.services.shared_state import MemorySharedState, SQLiteSharedState, create_shared_state
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def state(request, tmp_path):
+    if request.param == "memory":
+        return MemorySharedState()
+    return SQLiteSharedState(str(tmp_path / "state.db"))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(shared_state_module.time, "time", lambda: now[0])
+    return now
+
+
+def test_incr_within_refuses_past_the_limit(state):
+    assert state.incr_within("tokens:a", 400, 500) == (True, 400)
+    assert state.incr_within("tokens:a", 100, 500) == (True, 500)  # exactly at the limit is allowed
+    assert state.incr_within("tokens:a", 1, 500) == (False, 500)
+    assert state.incr_within("tokens:a", -50, 500) == (True, 450)
+    assert state.incr_within("tokens:b", 501, 500) == (False, 0)
+    assert state.get_int("tokens:b") == 0
+
+
+def test_expired_counter_starts_over(state, clock):
+    state.incr("tokens:a", 300, ttl=60)
+    clock[0] += 30
+    assert state.incr("tokens:a", 100, ttl=60) == 400  # ttl runs from the first write
+    clock[0] += 31
+    assert state.get_int("tokens:a") == 0
+    assert state.incr_within("tokens:a", 500, 500, ttl=60) == (True, 500)
+
+
+def test_cache_expires(state, clock):
+    state.cache_set("reply:a", "cached", ttl=10)
+    assert state.cache_get("reply:a") == "cached"
+    clock[0] += 10
+    assert state.cache_get("reply:a") is None
+
+
+def test_memory_backend_purges_expired_entries(clock, monkeypatch):
+    monkeypatch.setattr(shared_state_module, "PURGE_EVERY", 3)
+    state = MemorySharedState()
+
+    state.incr("tokens:old", 5, ttl=10)
+    state.cache_set("reply:old", "cached", ttl=10)
+    clock[0] += 60
+    state.incr("tokens:new", 1, ttl=10)  # third write triggers the sweep
+
+    assert set(state._counters) == {"tokens:new"}
+    assert state._cache == {}
+
+
+def _incr_in_child(state, parent_connection_id, results):
+    own_connection = id(state._connect()) != parent_connection_id
+    results.put((own_connection, state.incr("tokens:shared", 5)))
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_sqlite_backend_survives_fork(tmp_path):
+    state = SQLiteSharedState(str(tmp_path / "state.db"))
+    state.incr("tokens:shared", 1)  # the parent now holds an open connection
+
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    child = context.Process(target=_incr_in_child, args=(state, id(state._connect()), results))
+    child.start()
+    own_connection, child_value = results.get(timeout=10)
+    child.join(timeout=10)
+
+    assert own_connection
+    assert child_value == 6
+    assert state.incr("tokens:shared", 1) == 7
+
+
+def test_create_shared_state_urls(tmp_path):
+    assert isinstance(create_shared_state("memory://"), MemorySharedState)
+    assert isinstance(create_shared_state(f"sqlite:///{tmp_path / 'state.db'}"), SQLiteSharedState)
+    with pytest.raises(ValueError):
+        create_shared_state("redis://localhost")
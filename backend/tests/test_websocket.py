@@ -0,0 +1,142 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app import main
+
+ORIGIN = {"origin": main.origins[0]}
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Replace the streaming OpenAI call with a canned reply"""
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+
+        async def stream():
+            for word in ["We ship ", "in 3-5 ", "days."]:
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word))])
+
+        return stream()
+
+    monkeypatch.setattr(main.async_client.chat.completions, "create", create)
+    return calls
+
+
+def test_ping_pong(client):
+    with client.websocket_connect("/ws/chat?session_id=ws-ping", headers=ORIGIN) as ws:
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+
+
+def test_quick_reply(client):
+    with client.websocket_connect("/ws/chat?session_id=ws-quick", headers=ORIGIN) as ws:
+        ws.send_json({"type": "query", "query": "who won the football match yesterday"})
+        frame = ws.receive_json()
+    assert frame["type"] == "done"
+    assert frame["response"] == main.NON_ECOMMERCE_REPLY
+    assert frame["session_id"] == "ws-quick"
+
+
+@pytest.mark.parametrize("payload", ["not json", '{"type": "query"}', '["query"]'])
+def test_invalid_frame(client, payload):
+    with client.websocket_connect("/ws/chat?session_id=ws-invalid", headers=ORIGIN) as ws:
+        ws.send_text(payload)
+        assert ws.receive_json() == {"type": "error", "detail": "Invalid request"}
+        # The connection stays usable after a bad frame
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+
+
+def test_rejects_foreign_origin(client):
+    with pytest.raises(WebSocketDisconnect) as excinfo:
+        with client.websocket_connect("/ws/chat", headers={"origin": "https://evil.example"}) as ws:
+            ws.receive_json()
+    assert excinfo.value.code == 1008
+
+
+def test_streamed_reply_charges_actual_tokens(client, upstream):
+    query = "how long does delivery take to Pune"
+    with client.websocket_connect("/ws/chat?session_id=ws-stream", headers=ORIGIN) as ws:
+        ws.send_json({"type": "query", "query": query})
+        frames = [ws.receive_json()]
+        while frames[-1]["type"] != "done":
+            frames.append(ws.receive_json())
+
+    assert frames[0]["type"] == "start"
+    assert "".join(f["content"] for f in frames if f["type"] == "token") == "We ship in 3-5 days."
+    assert frames[-1]["response"] == "We ship in 3-5 days."
+    assert upstream[0]["max_tokens"] == main.WS_MAX_REPLY_TOKENS
+    # The reservation is refunded down to what the reply actually used
+    used = main.shared_state.get_int(main.quota_key("ws-stream"))
+    assert used == main.count_tokens(query) + main.count_tokens("We ship in 3-5 days.")
+
+
+def test_reply_is_refused_when_reservation_exceeds_limit(client, upstream):
+    query = "how long does delivery take to Jaipur"
+    # Room for the prompt but not for a full-length reply
+    already_used = main.MAX_TOKENS_PER_DAY - main.count_tokens(query) - main.WS_MAX_REPLY_TOKENS + 1
+    main.shared_state.incr(main.quota_key("ws-limit"), already_used, ttl=main.QUOTA_TTL)
+
+    with client.websocket_connect("/ws/chat?session_id=ws-limit", headers=ORIGIN) as ws:
+        ws.send_json({"type": "query", "query": query})
+        frame = ws.receive_json()
+
+    assert frame["response"] == main.DAILY_LIMIT_REPLY
+    assert not upstream
+    assert main.shared_state.get_int(main.quota_key("ws-limit")) == already_used
+
+
+def test_disconnect_mid_stream_refunds_unused_reservation(client, monkeypatch):
+    query = "how long does delivery take to Kochi"
+
+    async def create(**kwargs):
+        async def stream():
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="We ship "))])
+            await asyncio.Event().wait()  # upstream stalls until the turn is cancelled
+
+        return stream()
+
+    monkeypatch.setattr(main.async_client.chat.completions, "create", create)
+
+    with client.websocket_connect("/ws/chat?session_id=ws-cancel", headers=ORIGIN) as ws:
+        ws.send_json({"type": "query", "query": query})
+        assert ws.receive_json()["type"] == "start"
+        assert ws.receive_json() == {"type": "token", "content": "We ship "}
+
+    used = main.shared_state.get_int(main.quota_key("ws-cancel"))
+    assert used == main.count_tokens(query) + main.count_tokens("We ship ")
+
+
+def test_refund_goes_to_the_day_that_was_charged(client, monkeypatch):
+    query = "how long does delivery take to Delhi"
+    day = {"date": "2026-01-01"}
+    monkeypatch.setattr(main, "quota_key", lambda user_id: f"tokens:{user_id}:{day['date']}")
+
+    async def create(**kwargs):
+        async def stream():
+            day["date"] = "2026-01-02"  # the reply crosses midnight
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="We ship "))])
+
+        return stream()
+
+    monkeypatch.setattr(main.async_client.chat.completions, "create", create)
+
+    with client.websocket_connect("/ws/chat?session_id=ws-midnight", headers=ORIGIN) as ws:
+        ws.send_json({"type": "query", "query": query})
+        while ws.receive_json()["type"] != "done":
+            pass
+
+    charged = main.count_tokens(query) + main.count_tokens("We ship ")
+    assert main.shared_state.get_int("tokens:ws-midnight:2026-01-01") == charged
+    assert main.shared_state.get_int("tokens:ws-midnight:2026-01-02") == 0
@@ -35,6 +35,14 @@ interface ChatResponse {
 }
 
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL;
+const WS_BASE_URL = API_BASE_URL?.replace(/^http/, 'ws');
+
+// Frames pushed by the backend over /ws/chat
+interface SocketFrame extends Partial<ChatResponse> {
+  type: 'start' | 'token' | 'done' | 'error' | 'ping' | 'pong';
+  content?: string;
+  detail?: string;
+}
 
 
 // Custom components for ReactMarkdown - only render buttons for relevant links
@@ -79,11 +87,66 @@ const CaviaarModeChat: React.FC = () => {
   const [isLoading, setIsLoading] = useState(false);
   const [sessionId, setSessionId] = useState<string>('');
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  const socketRef = useRef<WebSocket | null>(null);
+  const streamingIdRef = useRef<string | null>(null);
 
   useEffect(() => {
     setSessionId(uuidv4());
   }, []);
 
+  // One persistent connection per session; sendMessage falls back to HTTP while it is down
+  useEffect(() => {
+    if (!sessionId || !WS_BASE_URL) return;
+
+    const socket = new WebSocket(`${WS_BASE_URL}/ws/chat?session_id=${encodeURIComponent(sessionId)}`);
+    socket.onmessage = (event) => handleSocketFrame(socket, JSON.parse(event.data));
+    socket.onclose = () => {
+      if (socketRef.current === socket) socketRef.current = null;
+      streamingIdRef.current = null;
+      setIsLoading(false);
+    };
+    socketRef.current = socket;
+
+    return () => socket.close();
+  }, [sessionId]);
+
+  const handleSocketFrame = (socket: WebSocket, frame: SocketFrame) => {
+    switch (frame.type) {
+      case 'ping':
+        socket.send(JSON.stringify({ type: 'pong' }));
+        return;
+      case 'start': {
+        const id = uuidv4();
+        streamingIdRef.current = id;
+        setMessages(prev => [...prev, { id, role: 'assistant', content: '', timestamp: new Date() }]);
+        return;
+      }
+      case 'token':
+        setMessages(prev => prev.map(m =>
+          m.id === streamingIdRef.current ? { ...m, content: m.content + (frame.content || '') } : m
+        ));
+        return;
+      case 'done': {
+        const id = streamingIdRef.current;
+        streamingIdRef.current = null;
+        const finalMessage: Message = {
+          id: id || uuidv4(),
+          role: 'assistant',
+          content: frame.response || '',
+          timestamp: new Date(),
+          suggestedProducts: frame.suggested_products || []
+        };
+        setMessages(prev => id ? prev.map(m => (m.id === id ? finalMessage : m)) : [...prev, finalMessage]);
+        setIsLoading(false);
+        return;
+      }
+      case 'error':
+        console.error('❌ Chat socket error:', frame.detail);
+        setIsLoading(false);
+        return;
+    }
+  };
+
   useEffect(() => {
     if (isOpen && !isMinimized) {
       messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -105,6 +168,12 @@ const CaviaarModeChat: React.FC = () => {
     setInput('');
     setIsLoading(true);
 
+    const socket = socketRef.current;
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      socket.send(JSON.stringify({ type: 'query', query: userMessage.content }));
+      return; // isLoading is cleared by the 'done' frame
+    }
+
     try {
       const endpoint = `${API_BASE_URL}/api/chat`;
       console.log('🔍 Sending request to:', endpoint);